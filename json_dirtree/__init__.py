@@ -3,29 +3,60 @@
 
 """Convert file and directory hierarchy to a JSON object."""
 
-from __future__ import (
-    absolute_import,
-    print_function,
-    unicode_literals
-)
-
 import argparse
+import concurrent.futures
+import functools
 import glob
 import hashlib
 import json
 import logging
 import os
-import shlex
 import subprocess
 import sys
+import threading
+from datetime import datetime, timezone
+from shutil import which
 try:
-    from shutil import which
+    from cryptography import x509
 except ImportError:
-    from distutils.spawn import find_executable as which
+    # fall back to shelling out to the openssl binary
+    x509 = None
 
 
 BASE_DIR = os.path.dirname(__file__)
 
+# traversal is I/O-bound, so oversubscribe the CPU count
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# skip pool overhead on small fan-out
+PARALLEL_THRESHOLD = 4
+
+# certificate properties reported by the check subcommand
+CERT_PROPS = ('subject', 'issuer', 'startdate', 'enddate', 'serial')
+
+# pre-initialized hash context; copying it skips the per-call EVP
+# algorithm fetch on OpenSSL 3 backed hashlib builds
+_SHA256 = hashlib.sha256()
+
+
+def _sha256_hexdigest(data):
+    """Hash ``data`` with a copy of the pre-initialized SHA-256 context."""
+    digest = _SHA256.copy()
+    digest.update(data)
+    return digest.hexdigest()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the shared traversal thread pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS)
+        return _executor
+
 
 class JSONDirTreeException(Exception):
     pass
@@ -115,143 +146,362 @@ class CLI(object):
 cli = CLI()
 
 
-def run(command, stdin=None):
-    """Execute a shell command and return the output and stderr)"""
-    if getattr(subprocess.Popen, '__enter__', None) and getattr(subprocess.Popen, '__exit__', None):
-        with subprocess.Popen(
-                shlex.split(command),
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True) as proc:
-            try:
-                out, err = proc.communicate(input=stdin, timeout=10)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                out, err = proc.communicate()
-            finally:
-                rc = proc.returncode
-    else:
-        proc = subprocess.Popen(
-                shlex.split(command),
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True)
-        try:
-            out, err = proc.communicate(input=stdin)
-        except Exception:
-            proc.kill()
-            out, err = proc.communicate()
-        finally:
-            rc = proc.returncode
-    return rc, out, err
+@functools.lru_cache(maxsize=None)
+def _openssl_path():
+    """Resolve the openssl executable once per process."""
+    path = which('openssl')
+    if path is None:
+        raise MissingExecutableError("executable 'openssl' not found")
+    return path
+
+
+def run(argv, stdin=None, binary=False):
+    """Execute a command given as an argv list, returning (rc, out).
+
+    With ``binary`` the output is returned as undecoded bytes. Unused
+    stdin and stderr go to /dev/null instead of holding open pipes,
+    which matters once many children run in parallel.
+    """
+    with subprocess.Popen(
+            argv,
+            stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=not binary) as proc:
+        out, _ = proc.communicate(input=stdin)
+    return proc.returncode, out
+
+
+def _read_file_text(path):
+    """Read file contents as text, replacing undecodable bytes.
+
+    Reading in binary mode skips newline translation and keeps binary
+    files from raising UnicodeDecodeError.
+    """
+    with open(path, 'rb') as fr:
+        return fr.read().decode('utf-8', 'replace')
+
+
+def _scan_dir(path, tree, hidden, readfiles, recursive):
+    """Scan a single directory into ``tree`` and return subdirs to visit.
+
+    Each returned item is a (path, subtree) pair whose subtree dict is
+    already linked into ``tree``.
+    """
+    pending = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # handle hidden files
+            if hidden or not entry.name.startswith('.'):
+                if entry.is_dir(follow_symlinks=False):
+                    # handle directories
+                    subtree = {}
+                    tree[entry.name] = subtree
+                    if recursive:
+                        pending.append((entry.path, subtree))
+                elif entry.is_file():
+                    # handle files
+                    if readfiles:
+                        # read file contents
+                        tree[entry.name] = _read_file_text(entry.path)
+                    else:
+                        tree[entry.name] = ''
+                else:
+                    # NOTE: only files and directories are handled
+                    pass
+    return pending
+
+
+def _walk_dirtree(path, tree, hidden, readfiles, recursive):
+    """Traverse ``path`` into ``tree`` with an explicit stack."""
+    stack = [(path, tree)]
+    while stack:
+        subpath, subtree = stack.pop()
+        stack.extend(_scan_dir(subpath, subtree, hidden, readfiles, recursive))
 
 
-def dirtree(path, hidden=False, readfiles=False, recursive=False):
-    """Build file and directory structure into a dictionary."""
+def dirtree(path, hidden=False, readfiles=False, recursive=False, parallel=True):
+    """Build file and directory structure into a dictionary.
+
+    Traversal is iterative, so arbitrarily deep trees never hit the
+    recursion limit. With ``parallel`` enabled, wide fan-out at the top
+    level is dispatched to a shared thread pool; each worker walks its
+    own disjoint subtree.
+    """
     tree = {}
-    for item in os.listdir(path):
-        # handle hidden files
-        if hidden or not item.startswith('.'):
-            fullpath = os.path.join(path, item)
-            if os.path.isdir(fullpath):
-                # handle directories
-                if recursive:
-                    # recurse into directories
-                    tree[item] = dirtree(fullpath, hidden, readfiles, recursive)
-                else:
-                    tree[item] = {}
-            elif os.path.isfile(fullpath):
-                # handle files
-                if readfiles:
-                    # read file contents
-                    with open(fullpath) as fr:
-                        tree[item] = fr.read()
-                else:
-                    tree[item] = ''
-            else:
-                # NOTE: only files and directories are handled
-                pass
+    pending = _scan_dir(path, tree, hidden, readfiles, recursive)
+    if parallel and len(pending) > PARALLEL_THRESHOLD:
+        executor = _get_executor()
+        futures = [executor.submit(_walk_dirtree, subpath, subtree,
+                                   hidden, readfiles, recursive)
+                   for subpath, subtree in pending]
+        for future in futures:
+            future.result()
+    else:
+        for subpath, subtree in pending:
+            _walk_dirtree(subpath, subtree, hidden, readfiles, recursive)
     return tree
 
 
-def get_openssl_prop(cert_path, prop_name):
-    """Get a single certificate property by its name."""
-    rc, out, _ = run('openssl x509 -noout -%s -in %s' % (prop_name, cert_path))
-    success = rc == 0
-    if not success:
-        logging.warning('unable to get certificate %s for %s', prop_name, cert_path)
-    key, _, value = out.partition('=')
-    return success, key, value.rstrip()
+def _load_cert(cert_path):
+    """Read and parse a PEM or DER certificate file in-process."""
+    with open(cert_path, 'rb') as fr:
+        data = fr.read()
+    try:
+        return x509.load_pem_x509_certificate(data)
+    except ValueError:
+        return x509.load_der_x509_certificate(data)
+
+
+def _cert_validity(cert):
+    """Return (not_before, not_after) as timezone-aware UTC datetimes."""
+    try:
+        return cert.not_valid_before_utc, cert.not_valid_after_utc
+    except AttributeError:
+        # cryptography < 42 only has the naive variants
+        return (cert.not_valid_before.replace(tzinfo=timezone.utc),
+                cert.not_valid_after.replace(tzinfo=timezone.utc))
+
+
+def _format_cert_date(date):
+    """Format a validity date canonically (zero-padded day, GMT suffix)."""
+    return date.strftime('%b %d %H:%M:%S %Y GMT')
+
+
+def _parse_openssl_date(value):
+    """Parse an ``openssl x509`` validity date into an aware datetime."""
+    return datetime.strptime(
+            value, '%b %d %H:%M:%S %Y %Z').replace(tzinfo=timezone.utc)
+
+
+def _format_serial(serial):
+    """Format a serial number as even-length uppercase hex, as openssl does."""
+    value = '%X' % serial
+    if len(value) % 2:
+        value = '0' + value
+    return value
+
+
+def _cert_prop(cert, prop_name):
+    """Extract a single property from a parsed certificate.
+
+    Keys match the ``openssl x509 -noout -<prop>`` output; values use
+    the canonical formats shared with the subprocess fallback
+    (RFC2253/RFC4514 names, zero-padded dates, even-length hex serial).
+    """
+    not_before, not_after = _cert_validity(cert)
+    if prop_name == 'subject':
+        return 'subject', cert.subject.rfc4514_string()
+    elif prop_name == 'issuer':
+        return 'issuer', cert.issuer.rfc4514_string()
+    elif prop_name == 'startdate':
+        return 'notBefore', _format_cert_date(not_before)
+    elif prop_name == 'enddate':
+        return 'notAfter', _format_cert_date(not_after)
+    elif prop_name == 'serial':
+        return 'serial', _format_serial(cert.serial_number)
+    raise JSONDirTreeException('unknown certificate property %r' % prop_name)
+
+
+def openssl_dump(cert_path, props=CERT_PROPS):
+    """Dump all checked certificate fields with a single openssl call."""
+    # absolute path skips the PATH walk in exec; RFC2253 names match the
+    # rfc4514_string() output of the cryptography backend
+    argv = [_openssl_path(), 'x509', '-noout', '-nameopt', 'RFC2253']
+    argv.extend('-%s' % prop for prop in props)
+    # the expiry flag always needs notAfter, even when not requested
+    want_enddate = 'enddate' in props
+    if not want_enddate:
+        argv.append('-enddate')
+    argv.extend(['-modulus', '-in', cert_path])
+    rc, out = run(argv, binary=True)
+    if rc != 0:
+        logging.warning('unable to parse certificate %s', cert_path)
+        return False, {}
+    info = {}
+    modulus = b''
+    for line in out.splitlines():
+        key, _, value = line.partition(b'=')
+        if key == b'Modulus':
+            # hash the raw bytes, skipping the decode/encode round trip;
+            # same uppercase hex the cryptography backend hashes
+            modulus = value.rstrip()
+        else:
+            info[key.decode()] = value.rstrip().decode()
+    # openssl exits 0 but prints 'Modulus=No modulus for this public key
+    # type' for non-RSA keys, so only hash values that are actually hex
+    try:
+        int(modulus, 16)
+    except ValueError:
+        info['modulusSHA256'] = None
+    else:
+        info['modulusSHA256'] = _sha256_hexdigest(modulus)
+    # -checkend would clobber the exit code, so compare notAfter here;
+    # re-emitting the dates also normalizes openssl's space-padded day
+    not_after = _parse_openssl_date(info['notAfter'])
+    if want_enddate:
+        info['notAfter'] = _format_cert_date(not_after)
+    else:
+        del info['notAfter']
+    if 'notBefore' in info:
+        info['notBefore'] = _format_cert_date(_parse_openssl_date(info['notBefore']))
+    info['expired'] = not_after <= datetime.now(timezone.utc)
+    return True, info
 
 
-def get_openssl_modulus_digest(cert_path, digest_type='sha256'):
-    """Compute digest for OpenSSL certificate key modulus."""
-    rc, out, _ = run('openssl x509 -noout -modulus -in %s' % cert_path)
-    success = rc == 0
-    if not success:
-        logging.warning('unable to get certificate modulus for %s', cert_path)
-        # raise error
-    key, _, value = out.partition('=')
-    hash_func = getattr(hashlib, digest_type)
-    value = value.rstrip().encode()
-    digest = hash_func(value).hexdigest()
-    return success, digest
+def is_cert_valid(cert_path):
+    """Test if certificate is expired.
 
+    Results are memoized per (path, mtime, size) so unchanged files are
+    checked at most once per process.
+    """
+    try:
+        st = os.stat(cert_path)
+    except OSError:
+        return False
+    return _cert_valid_cached(cert_path, st.st_mtime_ns, st.st_size)
 
-def is_cert_valid(cert_path):
-    """Test if certificate is expired."""
-    rc, out, _ = run('openssl x509 -noout -checkend 0 -in %s' % cert_path)
+
+@functools.lru_cache(maxsize=65536)
+def _cert_valid_cached(cert_path, mtime_ns, size):
+    if x509 is not None:
+        try:
+            _, not_after = _cert_validity(_load_cert(cert_path))
+        except (OSError, ValueError):
+            return False
+        return not_after > datetime.now(timezone.utc)
+    rc, _ = run([_openssl_path(), 'x509', '-noout', '-checkend', '0', '-in', cert_path])
     valid = rc == 0
     return valid
 
 
-def check_certificates(path, hidden=False, recursive=False,
-                       props=('subject', 'issuer', 'startdate', 'enddate', 'serial')):
-    """Check all certificates under a given path."""
+def stream_dirtree(path, fp, hidden=False, readfiles=False, recursive=False,
+                   _indent=0):
+    """Stream a file and directory structure to ``fp`` as indented JSON.
+
+    Emits the same output as ``json.dump(dirtree(...), fp, indent=2)``
+    while holding at most one file's contents in memory at a time.
+    """
+    pad = '  ' * (_indent + 1)
+    first = True
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # handle hidden files
+            if not hidden and entry.name.startswith('.'):
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not entry.is_file():
+                # NOTE: only files and directories are handled
+                continue
+            fp.write('{\n' if first else ',\n')
+            first = False
+            fp.write(pad + json.dumps(entry.name) + ': ')
+            if is_dir:
+                # handle directories
+                if recursive:
+                    stream_dirtree(entry.path, fp, hidden, readfiles,
+                                   recursive, _indent + 1)
+                else:
+                    fp.write('{}')
+            elif readfiles:
+                # read file contents
+                fp.write(json.dumps(_read_file_text(entry.path)))
+            else:
+                fp.write('""')
+    if first:
+        fp.write('{}')
+    else:
+        fp.write('\n' + '  ' * _indent + '}')
+
+
+def parse_cert(cert_path, props=CERT_PROPS):
+    """Collect all checked certificate fields in a single pass.
+
+    Returns a ``(success, info)`` tuple where ``info`` maps property
+    names to values plus the modulus digest and expiry flag. Results are
+    memoized per (path, mtime, size) so unchanged files parse only once.
+    """
+    try:
+        st = os.stat(cert_path)
+    except OSError:
+        logging.warning('unable to read certificate %s', cert_path)
+        return False, {}
+    # props may be any iterable; the cache key needs a hashable tuple
+    success, info = _parse_cert_cached(cert_path, st.st_mtime_ns, st.st_size,
+                                       tuple(props))
+    # copy so callers cannot mutate the cached entry
+    return success, dict(info)
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_cert_cached(cert_path, mtime_ns, size, props):
+    info = {}
+    if x509 is not None:
+        try:
+            cert = _load_cert(cert_path)
+        except (OSError, ValueError):
+            logging.warning('unable to parse certificate %s', cert_path)
+            return False, info
+        for prop in props:
+            key, value = _cert_prop(cert, prop)
+            info[key] = value
+        try:
+            modulus = '%X' % cert.public_key().public_numbers().n
+        except AttributeError:
+            # non-RSA keys (EC, Ed25519, ...) carry no modulus
+            info['modulusSHA256'] = None
+        else:
+            info['modulusSHA256'] = _sha256_hexdigest(modulus.encode())
+        _, not_after = _cert_validity(cert)
+        info['expired'] = not_after <= datetime.now(timezone.utc)
+        return True, info
+    return openssl_dump(cert_path, props)
+
+
+def check_certificates(path, hidden=False, recursive=False, props=CERT_PROPS):
+    """Check all certificates under a given path.
+
+    Per-cert parsing is latency-bound (file reads or subprocess waits),
+    so directories with many certs are fanned out to the shared thread
+    pool.
+    """
     tree = {}
-    for item in os.listdir(path):
-        # handle files
-        if hidden or not item.startswith('.'):
-            fullpath = os.path.join(path, item)
-            if os.path.isdir(fullpath) and recursive:
-                # recurse into directories
-                tree[item] = check_certificates(fullpath, hidden, recursive, props)
-            elif os.path.isfile(fullpath):
-                # handle certs
-                tree[item] = {}
-                for prop in props:
-                    success, key, value = get_openssl_prop(fullpath, prop)
-                    if not success:
-                        break
-                    tree[item][key] = value
-                if not success:
-                    tree.pop(item, None)
-                    continue
-                # modulus
-                success, digest = get_openssl_modulus_digest(fullpath)
-                tree[item]['modulusSHA256'] = digest
-                # is_expired
-                expired = not is_cert_valid(fullpath)
-                tree[item]['expired'] = expired
-        # NOTE: only files and directories are handled
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # handle files
+            if hidden or not entry.name.startswith('.'):
+                if entry.is_dir(follow_symlinks=False) and recursive:
+                    # recurse into directories
+                    tree[entry.name] = check_certificates(entry.path, hidden, recursive, props)
+                elif entry.is_file():
+                    files.append((entry.name, entry.path))
+            # NOTE: only files and directories are handled
+    parse = functools.partial(parse_cert, props=props)
+    if len(files) > PARALLEL_THRESHOLD:
+        results = _get_executor().map(parse, (p for _, p in files))
+    else:
+        results = (parse(p) for _, p in files)
+    for (name, _), (success, info) in zip(files, results):
+        # skip unparseable files
+        if success:
+            tree[name] = info
     return tree
 
 
 def find_expired_certs(path, hidden=False, recursive=False):
     tree = {}
-    for item in os.listdir(path):
-        # handle files
-        if hidden or not item.startswith('.'):
-            fullpath = os.path.join(path, item)
-            if os.path.isdir(fullpath) and recursive:
-                # recurse into directories
-                tree[item] = find_expired_certs(fullpath, hidden, recursive)
-            elif os.path.isfile(fullpath):
-                # is_expired
-                tree[item] = not is_cert_valid(fullpath)
-        # NOTE: only files and directories are handled
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # handle files
+            if hidden or not entry.name.startswith('.'):
+                if entry.is_dir(follow_symlinks=False) and recursive:
+                    # recurse into directories
+                    tree[entry.name] = find_expired_certs(entry.path, hidden, recursive)
+                elif entry.is_file():
+                    # is_expired
+                    tree[entry.name] = not is_cert_valid(entry.path)
+            # NOTE: only files and directories are handled
     return tree
 
 
@@ -259,36 +509,44 @@ def find_expired_certs(path, hidden=False, recursive=False):
 @cli.option('-x', '--expired', help='find expired certs', action='store_true', default=False)
 @cli.option('-a', '--hidden', help='search hidden files', action='store_true', default=False)
 @cli.option('dirs', nargs='*', help='source directories (default: ./src/* )',
-            default=glob.glob('src/*'))
+            default=None)
 def check_certs_command(dirs, hidden, expired):
     """Verifies TLS certificate validity in directories."""
-    if not which('openssl'):
-        raise MissingExecutableError("executable 'openssl' not found")
+    if not dirs:
+        # globbed lazily so importing the module never touches the fs
+        dirs = glob.glob('src/*')
+    if x509 is None:
+        # fail fast before the traversal starts
+        _openssl_path()
     cli.log.info('verifying TLS certificates in directories: %r', dirs)
     for d in dirs:
         if expired:
             tree = find_expired_certs(d, hidden, recursive=True)
         else:
             tree = check_certificates(d, hidden, recursive=True)
-        print(json.dumps(tree, indent=2))
+        # serialize straight to stdout instead of building the full string
+        json.dump(tree, sys.stdout, indent=2)
+        sys.stdout.write('\n')
 
 
 @cli.command('build')
 @cli.option('dirs', nargs='*', help='source directories (default: ./src/* )',
-            default=glob.glob('src/*'))
+            default=None)
 @cli.option('-o', '--out-dir', metavar='DIR', help='output directory', default='.')
 def build_command(dirs, out_dir):
     """Builds JSON output from directory and file tree."""
+    if not dirs:
+        dirs = glob.glob('src/*')
     cli.log.info('building JSON tree for dirs: %r', dirs)
     count = 0
     for dir_ in dirs:
         base = os.path.basename(dir_)
-        tree = dirtree(dir_, hidden=False, readfiles=True, recursive=True)
         file_name = '{0}.json'.format(base)
         dest_path = os.path.join(out_dir, file_name)
         with open(dest_path, 'w') as fr:
             cli.log.info('writing JSON output to: %r', dest_path)
-            json.dump(tree, fr, indent=2)
+            stream_dirtree(dir_, fr, hidden=False, readfiles=True,
+                           recursive=True)
         count += 1
     cli.log.info('done, %d files written', count)
 
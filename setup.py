@@ -24,19 +24,18 @@ setup(
         'Natural Language :: English',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Utilities',
     ],
+    python_requires='>=3.6',
     url='https://github.com/lukassup/json-dirtree',
     packages=find_packages(exclude=['tests', 'tests.*']),
     install_requires=[
     ],
+    extras_require={
+        'cryptography': ['cryptography'],
+    },
     entry_points={
         'console_scripts': [
             'json-dirtree = json_dirtree:cli.run',